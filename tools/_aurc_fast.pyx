@@ -0,0 +1,22 @@
+# cython: language_level=3
+"""Optional native encoder for `tools/aurc_mvp.py`.
+
+Build in place with `cythonize -i tools/_aurc_fast.pyx`. When the extension is
+not built, `aurc_mvp` keeps using its pure-Python `pack_instruction`.
+"""
+from libc.stdio cimport snprintf
+
+
+def pack_instruction(opcode, op0, op1, op2, imm):
+    # Mask as Python ints first so any int (negative or wider than 64 bits) is
+    # accepted exactly like the pure-Python encoder.
+    cdef unsigned long long word = (
+        (<unsigned long long>(opcode & 0xFF) << 56)
+        | (<unsigned long long>(op0 & 0xFF) << 48)
+        | (<unsigned long long>(op1 & 0xFF) << 40)
+        | (<unsigned long long>(op2 & 0xFF) << 32)
+        | <unsigned long long>(imm & 0xFFFFFFFF)
+    )
+    cdef char buf[19]
+    snprintf(buf, sizeof(buf), b"0x%016llX", word)
+    return buf[:18].decode("ascii")
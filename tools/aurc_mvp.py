@@ -15,37 +15,37 @@ interpreter while the full compiler is still under development.
 from __future__ import annotations
 
 import argparse
+import contextlib
+import functools
+import hashlib
+import os
 import re
+import struct
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 # ---------------------------------------------------------------------------
 # Data structures
 # ---------------------------------------------------------------------------
 
-@dataclass
-class StringBinding:
+class StringBinding(NamedTuple):
     name: str
     value: str
     register: str
     label: str
 
-@dataclass
-class ServiceCall:
+class ServiceCall(NamedTuple):
     service: str
     argument: str
 
-@dataclass
-class ExitCall:
+class ExitCall(NamedTuple):
     value: int
 
-@dataclass
-class ReturnStmt:
+class ReturnStmt(NamedTuple):
     value: int
 
-@dataclass
-class LoopSumIR:
+class LoopSumIR(NamedTuple):
     accumulator: str
     accumulator_init: int
     accumulator_reg: str
@@ -56,11 +56,12 @@ class LoopSumIR:
     return_var: str
 
 
-@dataclass
-class ProgramIR:
+# IR nodes are named tuples (and hold tuples) so whole programs are hashable and
+# can key the lowering cache.
+class ProgramIR(NamedTuple):
     kind: str
-    string_bindings: List[StringBinding] = field(default_factory=list)
-    print_calls: List[ServiceCall] = field(default_factory=list)
+    string_bindings: Tuple[StringBinding, ...] = ()
+    print_calls: Tuple[ServiceCall, ...] = ()
     exit_call: Optional[ExitCall] = None
     return_stmt: Optional[ReturnStmt] = None
     loop_sum: Optional[LoopSumIR] = None
@@ -144,78 +145,105 @@ def parse_string_program(src: str) -> ProgramIR:
 
     return ProgramIR(
         kind="string_print",
-        string_bindings=string_bindings,
-        print_calls=print_calls,
+        string_bindings=tuple(string_bindings),
+        print_calls=tuple(print_calls),
         exit_call=exit_call,
         return_stmt=return_stmt,
     )
 
 
-def parse_loop_sum_program(src: str) -> ProgramIR:
-    raw_lines = [line.strip() for line in src.splitlines() if line.strip() and not line.strip().startswith("//")]
-
-    registers_in_use = []
-    int_bindings: dict[str, tuple[int, str]] = {}
+@dataclass(slots=True)
+class _LoopProgramState:
+    lines: List[str]
+    index: int = 0  # line currently being handled
+    registers_in_use: List[str] = field(default_factory=list)
+    int_bindings: Dict[str, Tuple[int, str]] = field(default_factory=dict)
     exit_var: Optional[str] = None
     return_var: Optional[str] = None
-    loop_body: Optional[list[str]] = None
+    loop_body: Optional[List[str]] = None
     loop_condition_var: Optional[str] = None
 
-    i = 0
-    while i < len(raw_lines):
-        line = raw_lines[i]
 
-        if line.startswith("module") or line.startswith("fn "):
-            i += 1
-            continue
+def _parse_let(line: str, state: _LoopProgramState) -> None:
+    match = LET_INT_RE.fullmatch(line)
+    if match is None:
+        return
+    name = match.group("name")
+    value = int(match.group("value"))
+    if name in state.int_bindings:
+        raise ValueError(f"Duplicate binding for `{name}`.")
+    reg_index = len(state.registers_in_use) + 1
+    if reg_index >= 8:
+        raise ValueError("Loop lowering only supports up to 7 GP registers (r1-r7).")
+    reg = f"r{reg_index}"
+    if reg == "r0":
+        raise ValueError("Loop lowering reserves r0 for exit value.")
+    state.registers_in_use.append(reg)
+    state.int_bindings[name] = (value, reg)
+
+
+def _parse_while(line: str, state: _LoopProgramState) -> None:
+    match = WHILE_COND_RE.fullmatch(line)
+    if match is None:
+        return
+    state.loop_condition_var = match.group("var")
+    if state.loop_condition_var not in state.int_bindings:
+        raise ValueError("Loop condition references undefined variable.")
+    lines = state.lines
+    body: list[str] = []
+    i = state.index + 1
+    while i < len(lines) and lines[i] != "}":
+        if lines[i]:
+            body.append(lines[i])
+        i += 1
+    if i == len(lines):
+        raise ValueError("Unterminated while loop.")
+    state.loop_body = body
+    state.index = i  # closing brace; the caller steps past it
 
-        if line == "}":
-            i += 1
-            continue
 
-        if match := LET_INT_RE.fullmatch(line):
-            name = match.group("name")
-            value = int(match.group("value"))
-            if name in int_bindings:
-                raise ValueError(f"Duplicate binding for `{name}`.")
-            reg_index = len(registers_in_use) + 1
-            if reg_index >= 8:
-                raise ValueError("Loop lowering only supports up to 7 GP registers (r1-r7).")
-            reg = f"r{reg_index}"
-            if reg == "r0":
-                raise ValueError("Loop lowering reserves r0 for exit value.")
-            registers_in_use.append(reg)
-            int_bindings[name] = (value, reg)
-            i += 1
-            continue
+def _parse_request(line: str, state: _LoopProgramState) -> None:
+    if match := EXIT_VAR_RE.fullmatch(line):
+        state.exit_var = match.group("name")
 
-        if match := WHILE_COND_RE.fullmatch(line):
-            loop_condition_var = match.group("var")
-            if loop_condition_var not in int_bindings:
-                raise ValueError("Loop condition references undefined variable.")
-            body: list[str] = []
-            i += 1
-            while i < len(raw_lines) and raw_lines[i] != "}":
-                if raw_lines[i]:
-                    body.append(raw_lines[i])
-                i += 1
-            if i == len(raw_lines):
-                raise ValueError("Unterminated while loop.")
-            loop_body = body
-            i += 1  # skip closing brace
-            continue
 
-        if match := EXIT_VAR_RE.fullmatch(line):
-            exit_var = match.group("name")
-            i += 1
-            continue
+def _parse_return(line: str, state: _LoopProgramState) -> None:
+    if match := RETURN_VAR_RE.fullmatch(line):
+        state.return_var = match.group("name")
 
-        if match := RETURN_VAR_RE.fullmatch(line):
-            return_var = match.group("name")
-            i += 1
-            continue
 
-        i += 1
+def _skip_statement(line: str, state: _LoopProgramState) -> None:
+    pass
+
+
+# Every loop-program statement is identified by its first word, so each line runs
+# at most one regex. Unknown first words are skipped like the structural lines.
+LOOP_STATEMENT_HANDLERS = {
+    "let": _parse_let,
+    "while": _parse_while,
+    "request": _parse_request,
+    "return": _parse_return,
+    "module": _skip_statement,
+    "fn": _skip_statement,
+    "}": _skip_statement,
+}
+
+
+def parse_loop_sum_program(src: str) -> ProgramIR:
+    raw_lines = [line.strip() for line in src.splitlines() if line.strip() and not line.strip().startswith("//")]
+
+    state = _LoopProgramState(raw_lines)
+    while state.index < len(raw_lines):
+        line = raw_lines[state.index]
+        # Split on any whitespace, as the statement regexes' `\s+` does.
+        LOOP_STATEMENT_HANDLERS.get(line.split(None, 1)[0], _skip_statement)(line, state)
+        state.index += 1
+
+    int_bindings = state.int_bindings
+    exit_var = state.exit_var
+    return_var = state.return_var
+    loop_body = state.loop_body
+    loop_condition_var = state.loop_condition_var
 
     if loop_body is None or loop_condition_var is None:
         raise ValueError("Loop lowering requires a single while-loop.")
@@ -288,16 +316,25 @@ ISA_OPCODE_CJMP = 0x08
 ISA_OPERAND_LABEL = 0xFE
 ISA_OPERAND_IMMEDIATE = 0xFF
 
+# The MVP path only issues these two service calls, so their encodings are fixed.
+SVC_WRITE_STDOUT = "bytes 0x0B01010000000000  ; svc 0x01 write(stdout)"
+SVC_EXIT_R0 = "bytes 0x0B02000000000000  ; svc 0x02 exit(r0)"
+
+
+# Big-endian instruction word: opcode, op0, op1, op2 bytes followed by imm32.
+_INSTRUCTION_WORD = struct.Struct(">BBBBI")
+
 
 def pack_instruction(opcode: int, op0: int, op1: int, op2: int, imm: int) -> str:
-    word = (
-        ((opcode & 0xFF) << 56)
-        | ((op0 & 0xFF) << 48)
-        | ((op1 & 0xFF) << 40)
-        | ((op2 & 0xFF) << 32)
-        | (imm & 0xFFFFFFFF)
-    )
-    return f"0x{word:016X}"
+    word = _INSTRUCTION_WORD.pack(opcode & 0xFF, op0 & 0xFF, op1 & 0xFF, op2 & 0xFF, imm & 0xFFFFFFFF)
+    return "0x" + word.hex().upper()
+
+
+try:  # Optional Cython build of the encoder (tools/_aurc_fast.pyx); same output.
+    import _aurc_fast
+    from _aurc_fast import pack_instruction
+except ImportError:
+    _aurc_fast = None
 
 
 def encode_mov_label(dest_reg: str, label: str) -> str:
@@ -350,24 +387,61 @@ def encode_jmp(label: str) -> str:
     return f"bytes {word}  ; jmp {label}"
 
 
-def encode_svc(imm: int, comment: str) -> str:
-    if imm == 0x01:
-        return "bytes 0x0B01010000000000  ; svc 0x01 write(stdout)"
-    if imm == 0x02:
-        return "bytes 0x0B02000000000000  ; svc 0x02 exit(r0)"
-    raise ValueError("Unsupported svc immediate in MVP path.")
+_REGISTER_IDS = {f"r{index}": index for index in range(8)}
 
 
 def register_to_id(reg: str) -> int:
-    if not reg.startswith("r"):
-        raise ValueError(f"Unexpected register name: {reg}")
-    idx = int(reg[1:])
-    if not 0 <= idx <= 7:
-        raise ValueError("Register index out of range for minimal ISA (r0-r7)")
-    return idx
+    try:
+        return _REGISTER_IDS[reg]
+    except KeyError:
+        if not reg.startswith("r"):
+            raise ValueError(f"Unexpected register name: {reg}") from None
+        raise ValueError("Register index out of range for minimal ISA (r0-r7)") from None
+
+
+@functools.lru_cache(maxsize=256)
+def lower_to_manifest(ir: ProgramIR) -> Tuple[str, ...]:
+    # Memoized for library callers lowering many (often identical) programs.
+    return tuple(iter_manifest_lines(ir))
+
+
+# Fixed manifest lines and skeleton format strings are built once at import; lowering only
+# encodes the varying instruction words and substitutes them in a single pass.
+_MANIFEST_PREFIX = (
+    "header minimal_isa\n"
+    "org 0x0000\n"
+    "label main\n"
+)
+_MANIFEST_PREFIX_LINES = tuple(_MANIFEST_PREFIX.splitlines(keepends=True))
+
+_SVC_WRITE_STDOUT_LINE = SVC_WRITE_STDOUT + "\n"
+_STRING_EXIT_LINES = (SVC_EXIT_R0 + "\n", "halt\n")
+
+_STRING_DATA_TEMPLATE = (
+    "label {label}\n"
+    "ascii \"{literal}\"\n"
+    "pad 0x0010\n"
+)
+
+_LOOP_SUM_TEMPLATE = (
+    _MANIFEST_PREFIX
+    + "{init_accumulator}  ; accumulator\n"
+    "{init_counter}  ; counter\n"
+    "label loop\n"
+    "{accumulate}  ; accumulator += counter\n"
+    "{decrement}  ; counter--\n"
+    "{compare}  ; compare with zero\n"
+    "{branch_exit}  ; if zero -> exit\n"
+    "{branch_loop}  ; loop back (placeholder displacement)\n"
+    "label exit\n"
+    "{move_result}  ; move result into r0\n"
+    + SVC_EXIT_R0 + "      ; exit with result\n"
+    + "halt\n"
+)
 
 
-def lower_to_manifest(ir: ProgramIR) -> List[str]:
+# Manifest lines are produced lazily and already carry their trailing newline.
+def iter_manifest_lines(ir: ProgramIR) -> Iterator[str]:
     if ir.kind == "string_print":
         return lower_string_program(ir)
     if ir.kind == "loop_sum":
@@ -377,16 +451,12 @@ def lower_to_manifest(ir: ProgramIR) -> List[str]:
     raise ValueError(f"Unsupported program kind `{ir.kind}`.")
 
 
-def lower_string_program(ir: ProgramIR) -> List[str]:
-    lines: List[str] = []
-
-    lines.append("header minimal_isa")
-    lines.append("org 0x0000")
-    lines.append("label main")
+def lower_string_program(ir: ProgramIR) -> Iterator[str]:
+    yield from _MANIFEST_PREFIX_LINES
 
     # Move each string literal into its assigned register ahead of use.
     for binding in ir.string_bindings:
-        lines.append(encode_mov_label(binding.register, binding.label))
+        yield encode_mov_label(binding.register, binding.label) + "\n"
 
     # Emit print calls in order.
     for call in ir.print_calls:
@@ -395,7 +465,7 @@ def lower_string_program(ir: ProgramIR) -> List[str]:
             raise ValueError(f"Print argument `{call.argument}` not bound to a string literal.")
         if binding.register != "r1":
             raise ValueError("MVP compiler expects print argument in r1.")
-        lines.append(encode_svc(0x01, "write(stdout)"))
+        yield _SVC_WRITE_STDOUT_LINE
 
     # Ensure return value in r0 matches exit argument.
     if ir.exit_call is None or ir.return_stmt is None:
@@ -404,55 +474,109 @@ def lower_string_program(ir: ProgramIR) -> List[str]:
     if ir.exit_call.value != ir.return_stmt.value:
         raise ValueError("Exit value and return value must match in MVP program.")
 
-    lines.append(encode_mov_immediate("r0", ir.return_stmt.value))
+    yield encode_mov_immediate("r0", ir.return_stmt.value) + "\n"
 
-    lines.append(encode_svc(0x02, "exit(r0)"))
-    lines.append("halt")
+    yield from _STRING_EXIT_LINES
 
     # Emit string literals as data.
     for binding in ir.string_bindings:
-        lines.append(f"label {binding.label}")
         literal = binding.value.replace("\"", "\\\"")
-        lines.append(f"ascii \"{literal}\"")
-        lines.append("pad 0x0010")
+        yield from _STRING_DATA_TEMPLATE.format(label=binding.label, literal=literal).splitlines(keepends=True)
 
-    return lines
 
-
-def lower_loop_sum(loop_ir: LoopSumIR) -> List[str]:
+def lower_loop_sum(loop_ir: LoopSumIR) -> Iterator[str]:
     if loop_ir.accumulator_reg != "r1" or loop_ir.counter_reg != "r2":
         raise ValueError("Loop lowering currently requires accumulator in r1 and counter in r2.")
 
-    lines: List[str] = []
-
-    lines.append("header minimal_isa")
-    lines.append("org 0x0000")
-    lines.append("label main")
-    lines.append(f"{encode_mov_immediate(loop_ir.accumulator_reg, loop_ir.accumulator_init)}  ; accumulator")
-    lines.append(f"{encode_mov_immediate(loop_ir.counter_reg, loop_ir.counter_init)}  ; counter")
-    lines.append("label loop")
-    lines.append(f"{encode_add_reg_reg(loop_ir.accumulator_reg, loop_ir.accumulator_reg, loop_ir.counter_reg)}  ; accumulator += counter")
-    lines.append(f"{encode_sub_reg_imm(loop_ir.counter_reg, loop_ir.counter_reg, 1)}  ; counter--")
-    lines.append(f"{encode_cmp_reg_imm(loop_ir.counter_reg, 0)}  ; compare with zero")
-    lines.append(f"{encode_cjmp_eq('exit')}  ; if zero -> exit")
-    lines.append(f"{encode_jmp('loop')}  ; loop back (placeholder displacement)")
-    lines.append("label exit")
-    lines.append(f"{encode_mov_register('r0', loop_ir.accumulator_reg)}  ; move result into r0")
-    lines.append("bytes 0x0B02000000000000  ; svc 0x02 exit(r0)      ; exit with result")
-    lines.append("halt")
-
-    return lines
+    acc, counter = loop_ir.accumulator_reg, loop_ir.counter_reg
+    manifest = _LOOP_SUM_TEMPLATE.format(
+        init_accumulator=encode_mov_immediate(acc, loop_ir.accumulator_init),
+        init_counter=encode_mov_immediate(counter, loop_ir.counter_init),
+        accumulate=encode_add_reg_reg(acc, acc, counter),
+        decrement=encode_sub_reg_imm(counter, counter, 1),
+        compare=encode_cmp_reg_imm(counter, 0),
+        branch_exit=encode_cjmp_eq("exit"),
+        branch_loop=encode_jmp("loop"),
+        move_result=encode_mov_register("r0", acc),
+    )
+    yield from manifest.splitlines(keepends=True)
 
 
 # ---------------------------------------------------------------------------
 # CLI
 # ---------------------------------------------------------------------------
 
-def compile_file(source_path: Path, output_path: Path) -> None:
+CACHE_DIR_NAME = ".aurc_cache"
+CACHE_MAX_ENTRIES = 64
+
+# Folded into every cache key so edits to the compiler itself (or a rebuilt native
+# encoder) invalidate old manifests.
+_compiler_hash = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16)
+if _aurc_fast is not None:
+    _compiler_hash.update(Path(_aurc_fast.__file__).read_bytes())
+_COMPILER_DIGEST = _compiler_hash.digest()
+del _compiler_hash
+
+
+def manifest_cache_key(src: str) -> str:
+    digest = hashlib.blake2b(_COMPILER_DIGEST, digest_size=16)
+    digest.update(src.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def prune_manifest_cache(cache_dir: Path, max_entries: int = CACHE_MAX_ENTRIES) -> None:
+    entries = []
+    for entry in cache_dir.glob("*.aurs"):
+        try:
+            entries.append((entry.stat().st_mtime, entry))
+        except FileNotFoundError:  # evicted by a concurrent compile
+            continue
+    entries.sort()
+    for _, stale in entries[: max(len(entries) - max_entries, 0)]:
+        stale.unlink(missing_ok=True)
+
+
+def write_atomically(path: Path, lines: Iterable[str]) -> None:
+    # Readers (and concurrent compiles) only ever see complete files: write to a
+    # per-process sibling temp file, then replace the target in one step. Lowering
+    # is lazy, so errors can surface mid-stream and leave the target untouched.
+    partial_path = path.with_name(f"{path.name}.{os.getpid()}.partial")
+    try:
+        with partial_path.open("w", encoding="utf-8") as handle:
+            handle.writelines(lines)
+        os.replace(partial_path, path)
+    except BaseException:
+        partial_path.unlink(missing_ok=True)
+        raise
+
+
+def compile_file(source_path: Path, output_path: Path, use_cache: bool = True) -> None:
     src = source_path.read_text(encoding="utf-8")
+
+    cache_entry: Optional[Path] = None
+    if use_cache:
+        cache_dir = output_path.parent / CACHE_DIR_NAME
+        cache_entry = cache_dir / f"{manifest_cache_key(src)}.aurs"
+        try:
+            cached = cache_entry.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            pass
+        else:
+            write_atomically(output_path, (cached,))
+            with contextlib.suppress(FileNotFoundError):  # pruned by a concurrent compile
+                os.utime(cache_entry)  # refresh mtime so pruning evicts least recently used
+            return
+
     ir = parse_source(src)
-    manifest_lines = lower_to_manifest(ir)
-    output_path.write_text("\n".join(manifest_lines) + "\n", encoding="utf-8")
+    if cache_entry is None:
+        write_atomically(output_path, iter_manifest_lines(ir))
+        return
+
+    manifest = lower_to_manifest(ir)
+    write_atomically(output_path, manifest)
+    cache_entry.parent.mkdir(parents=True, exist_ok=True)
+    write_atomically(cache_entry, manifest)
+    prune_manifest_cache(cache_entry.parent)
 
 
 def main() -> None:
@@ -462,6 +586,11 @@ def main() -> None:
     compile_cmd = sub.add_parser("compile", help="Compile .aur source to .aurs manifest")
     compile_cmd.add_argument("source", type=Path, help="Path to Aurora source (.aur)")
     compile_cmd.add_argument("-o", "--output", type=Path, help="Output manifest path (.aurs)")
+    compile_cmd.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"Always re-lower the source instead of reusing manifests from {CACHE_DIR_NAME}/",
+    )
 
     args = parser.parse_args()
 
@@ -472,7 +601,7 @@ def main() -> None:
             output_path = args.output
         else:
             output_path = source_path.with_suffix(".aurs")
-        compile_file(source_path, output_path)
+        compile_file(source_path, output_path, use_cache=not args.no_cache)
         print(f"[aurc-mvp] Wrote manifest to {output_path}")
 
 
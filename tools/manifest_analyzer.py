@@ -12,115 +12,211 @@ Usage:
 from __future__ import annotations
 
 import argparse
+import functools
 import re
+import struct
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
-HEX_RE = re.compile(r"^0[xX]([0-9A-Fa-f]+)$")
+# One match per manifest line: the directive, its single operand, and any further
+# tokens (`extra`), ignoring `#` comments. Blank/comment-only lines leave
+# `directive` unset.
+_LINE_RE = re.compile(
+    r"\s*(?:(?P<directive>[^\s#]+)(?:\s+(?P<arg>[^\s#]+))?\s*(?P<extra>[^\s#][^#]*?)?)?\s*(?:#.*)?$"
+)
 
 
 def parse_hex(token: str) -> int:
-    match = HEX_RE.match(token)
-    if not match:
+    # int() accepts the 0x prefix itself; digit separators and non-ASCII (Unicode)
+    # digits still need rejecting.
+    if not token.startswith(("0x", "0X")) or "_" in token or not token.isascii():
         raise ValueError(f"Expected hex literal, got {token!r}")
-    return int(match.group(1), 16)
+    try:
+        return int(token, 16)
+    except ValueError:
+        raise ValueError(f"Expected hex literal, got {token!r}") from None
 
 
 def chunks(data: bytes, size: int) -> List[bytes]:
     return [data[i : i + size] for i in range(0, len(data), size)]
 
 
-def analyze_manifest(path: Path) -> Tuple[bytearray, Dict[str, int], List[Tuple[int, bytes]]]:
-    binary = bytearray()
-    labels: Dict[str, int] = {}
-    byte_runs: List[Tuple[int, bytes]] = []  # (start_offset, bytes)
+# Pending image write: (start_offset, packer, payload). Raw `bytes` runs carry
+# packer None; uN directives carry their struct and the integer to pack in place.
+_Write = Tuple[int, Optional[struct.Struct], Union[bytes, int]]
 
-    current_offset = 0
 
-    with path.open("r", encoding="utf-8") as handle:
-        for raw_line in handle:
-            line = raw_line.split("#", 1)[0].strip()
-            if not line:
-                continue
+@dataclass
+class _ManifestState:
+    labels: Dict[str, int] = field(default_factory=dict)
+    writes: List[_Write] = field(default_factory=list)
+    offset: int = 0
+    extent: int = 0  # furthest byte the image reaches
 
-            tokens = line.split()
-            directive = tokens[0]
-
-            def ensure_length(target: int) -> None:
-                if target > len(binary):
-                    binary.extend([0] * (target - len(binary)))
-
-            if directive == "org":
-                if len(tokens) != 2:
-                    raise ValueError(f"Invalid org directive: {raw_line.strip()}")
-                current_offset = parse_hex(tokens[1])
-                ensure_length(current_offset)
-            elif directive == "pad":
-                if len(tokens) != 2:
-                    raise ValueError(f"Invalid pad directive: {raw_line.strip()}")
-                pad_len = parse_hex(tokens[1])
-                ensure_length(current_offset + pad_len)
-                current_offset += pad_len
-            elif directive == "label":
-                if len(tokens) != 2:
-                    raise ValueError(f"Invalid label directive: {raw_line.strip()}")
-                label = tokens[1]
-                labels[label] = current_offset
-            elif directive == "bytes":
-                if len(tokens) != 2:
-                    raise ValueError(f"Invalid bytes directive: {raw_line.strip()}")
-                hex_blob = tokens[1]
-                if not hex_blob.startswith("0x") and not hex_blob.startswith("0X"):
-                    raise ValueError(f"bytes directive must use 0x prefix: {raw_line.strip()}")
-                data = bytes.fromhex(hex_blob[2:])
-                ensure_length(current_offset)
-                ensure_length(current_offset + len(data))
-                binary[current_offset : current_offset + len(data)] = data
-                byte_runs.append((current_offset, data))
-                current_offset += len(data)
-            elif directive in {"u16", "u32", "u64"}:
-                if len(tokens) != 2:
-                    raise ValueError(f"Invalid {directive} directive: {raw_line.strip()}")
-                value = parse_hex(tokens[1])
-                size = {"u16": 2, "u32": 4, "u64": 8}[directive]
-                data = value.to_bytes(size, byteorder="little")
-                ensure_length(current_offset)
-                ensure_length(current_offset + size)
-                binary[current_offset : current_offset + size] = data
-                byte_runs.append((current_offset, data))
-                current_offset += size
-            elif directive == "header":
-                # Metadata; no effect on offset.
-                continue
-            elif directive == "ref":
-                # Data manifests may include ref entries (treated as 8 bytes placeholder for now).
-                # They do not contribute to the binary until resolved, so skip from code analyzer.
-                continue
-            else:
-                raise ValueError(f"Unsupported directive {directive!r} in {raw_line.strip()}")
 
-    return binary, labels, byte_runs
+def _require_arg(directive: str, arg: Optional[str], raw_line: str) -> str:
+    if arg is None:
+        raise ValueError(f"Invalid {directive} directive: {raw_line.strip()}")
+    return arg
 
 
-def find_control_transfers(byte_runs: List[Tuple[int, bytes]]) -> List[Tuple[int, str, int]]:
-    transfers: List[Tuple[int, str, int]] = []  # (offset, mnemonic, imm32)
-    for start, data in byte_runs:
-        i = 0
-        while i < len(data):
-            opcode = data[i]
-            if opcode in (0xE8, 0xE9):
-                if i + 4 >= len(data):
-                    break
-                disp = int.from_bytes(data[i + 1 : i + 5], byteorder="little", signed=True)
-                # Filter out obvious false positives (e.g., immediates embedded in other opcodes).
-                if abs(disp) > 0x100000:
-                    i += 1
-                    continue
-                mnemonic = "call" if opcode == 0xE8 else "jmp"
-                transfers.append((start + i, mnemonic, disp))
-                i += 5
+def _emit(state: _ManifestState, size: int, packer: Optional[struct.Struct], payload: Union[bytes, int]) -> None:
+    state.writes.append((state.offset, packer, payload))
+    state.offset += size
+    state.extent = max(state.extent, state.offset)
+
+
+def _handle_org(directive: str, arg: Optional[str], raw_line: str, state: _ManifestState) -> None:
+    state.offset = parse_hex(_require_arg(directive, arg, raw_line))
+    state.extent = max(state.extent, state.offset)
+
+
+def _handle_pad(directive: str, arg: Optional[str], raw_line: str, state: _ManifestState) -> None:
+    state.offset += parse_hex(_require_arg(directive, arg, raw_line))
+    state.extent = max(state.extent, state.offset)
+
+
+def _handle_label(directive: str, arg: Optional[str], raw_line: str, state: _ManifestState) -> None:
+    state.labels[_require_arg(directive, arg, raw_line)] = state.offset
+
+
+def _handle_bytes(directive: str, arg: Optional[str], raw_line: str, state: _ManifestState) -> None:
+    hex_blob = _require_arg(directive, arg, raw_line)
+    if not hex_blob.startswith(("0x", "0X")):
+        raise ValueError(f"bytes directive must use 0x prefix: {raw_line.strip()}")
+    data = bytes.fromhex(hex_blob[2:])
+    _emit(state, len(data), None, data)
+
+
+_UINT_STRUCTS = {"u16": struct.Struct("<H"), "u32": struct.Struct("<I"), "u64": struct.Struct("<Q")}
+
+
+def _handle_uint(directive: str, arg: Optional[str], raw_line: str, state: _ManifestState) -> None:
+    value = parse_hex(_require_arg(directive, arg, raw_line))
+    packer = _UINT_STRUCTS[directive]
+    if value >> (8 * packer.size):
+        raise ValueError(f"{directive} value does not fit in {packer.size} bytes: {raw_line.strip()}")
+    _emit(state, packer.size, packer, value)
+
+
+def _skip(directive: str, arg: Optional[str], raw_line: str, state: _ManifestState) -> None:
+    pass
+
+
+DIRECTIVE_HANDLERS = {
+    "org": _handle_org,
+    "pad": _handle_pad,
+    "label": _handle_label,
+    "bytes": _handle_bytes,
+    "u16": _handle_uint,
+    "u32": _handle_uint,
+    "u64": _handle_uint,
+    # Metadata; no effect on offset.
+    "header": _skip,
+    # Data manifests may include ref entries (treated as 8 bytes placeholder for now).
+    # They do not contribute to the binary until resolved, so skip from code analyzer.
+    "ref": _skip,
+}
+
+
+def _written_extents(writes: List[_Write]) -> List[Tuple[int, int]]:
+    # (start, end) spans of the image covered by directive writes, with adjacent and
+    # overlapping writes merged so runs that continue across directives stay whole.
+    extents: List[Tuple[int, int]] = []
+    for start, end in sorted(
+        (start, start + (len(payload) if packer is None else packer.size)) for start, packer, payload in writes
+    ):
+        if start == end:
+            continue
+        if extents and start <= extents[-1][1]:
+            extents[-1] = (extents[-1][0], max(extents[-1][1], end))
+        else:
+            extents.append((start, end))
+    return extents
+
+
+def analyze_manifest(path: Path) -> Tuple[bytearray, Dict[str, int], List[Tuple[int, int]]]:
+    # First pass: resolve offsets and collect the pending writes, tracking how far the
+    # image extends so the binary can be allocated once at its final size.
+    state = _ManifestState()
+
+    with path.open("r", encoding="utf-8") as handle:
+        for raw_line in handle:
+            match = _LINE_RE.match(raw_line)
+            directive = match.group("directive")
+            if directive is None:
+                continue
+            # Every operand-taking directive expects exactly one token after it.
+            arg = match.group("arg") if match.group("extra") is None else None
+            handler = DIRECTIVE_HANDLERS.get(directive)
+            if handler is None:
+                raise ValueError(f"Unsupported directive {directive!r} in {raw_line.strip()}")
+            handler(directive, arg, raw_line, state)
+
+    # Second pass: decode each write straight into the preallocated image (later
+    # writes still overwrite earlier ones).
+    binary = bytearray(state.extent)
+    with memoryview(binary) as view:
+        for start, packer, payload in state.writes:
+            if packer is None:
+                view[start : start + len(payload)] = payload
             else:
-                i += 1
+                packer.pack_into(view, start, payload)
+
+    return binary, state.labels, _written_extents(state.writes)
+
+
+CONTROL_TRANSFER_MNEMONICS = {0xE8: "call", 0xE9: "jmp"}
+MAX_PLAUSIBLE_DISPLACEMENT = 0x100000
+_DISP32 = struct.Struct("<i")
+# Importing NumPy costs ~120 ms, about what the plain scan spends on 2 MiB, so
+# smaller extents (every manifest in the tree so far) never pay for it.
+_NUMPY_MIN_BYTES = 2 * 1024 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    try:  # NumPy is optional; without it the opcode scan stays in plain Python.
+        import numpy
+    except ImportError:  # pragma: no cover - depends on the local environment
+        return None
+    return numpy
+
+
+# (index, opcode, disp32) for every call/jmp opcode followed by a full displacement.
+def _transfer_candidates(data: memoryview) -> Iterable[Tuple[int, int, int]]:
+    np = _numpy() if len(data) >= _NUMPY_MIN_BYTES else None
+    if np is not None:
+        arr = np.frombuffer(data, dtype=np.uint8)
+        idxs = np.flatnonzero((arr == 0xE8) | (arr == 0xE9))
+        idxs = idxs[idxs + 4 < len(arr)]
+        disps = arr[idxs[:, None] + np.arange(1, 5)].view("<i4").ravel()
+        return zip(idxs.tolist(), arr[idxs].tolist(), disps.tolist())
+    return (
+        (i, data[i], _DISP32.unpack_from(data, i + 1)[0])
+        for i in range(len(data) - 4)
+        if data[i] in CONTROL_TRANSFER_MNEMONICS
+    )
+
+
+def find_control_transfers(binary: bytes, extents: Iterable[Tuple[int, int]]) -> List[Tuple[int, str, int]]:
+    # Only the written extents are scanned: org/pad zero fill holds no opcodes. Each
+    # extent spans every directive that touches it, so transfers straddling
+    # adjacent directives are found too.
+    transfers: List[Tuple[int, str, int]] = []  # (offset, mnemonic, imm32)
+    view = memoryview(binary)
+    for start, end in extents:
+        resume = start  # bytes consumed by an accepted transfer are not rescanned
+        for i, opcode, disp in _transfer_candidates(view[start:end]):
+            i += start
+            if i < resume:
+                continue
+            # Filter out obvious false positives (e.g., immediates embedded in other opcodes).
+            if abs(disp) > MAX_PLAUSIBLE_DISPLACEMENT:
+                continue
+            transfers.append((i, CONTROL_TRANSFER_MNEMONICS[opcode], disp))
+            resume = i + 5
     return transfers
 
 
@@ -130,8 +226,8 @@ def main() -> None:
     parser.add_argument("--bin", type=Path, help="Optional output path for raw binary dump")
     args = parser.parse_args()
 
-    binary, labels, byte_runs = analyze_manifest(args.manifest)
-    transfers = find_control_transfers(byte_runs)
+    binary, labels, extents = analyze_manifest(args.manifest)
+    transfers = find_control_transfers(binary, extents)
 
     print("Labels:\n--------")
     for name, offset in sorted(labels.items(), key=lambda item: item[1]):